@@ -1,33 +1,180 @@
 import asyncio
+import cProfile
+import hashlib
+import heapq
+import itertools
+import io
+import json
 import logging
+import logging.handlers
 import os
+import pstats
+import queue
 import tempfile
+import urllib.error
 import urllib.request
 import ssl
 import certifi
 import sqlite3
+import sys
+import threading
+import time
+import traceback
+from collections import deque
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from pathlib import Path
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Tuple, Optional, Dict, Any, Callable, Awaitable
 
 from pyrogram import Client, filters, idle
-from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message
-from pyrogram.errors import RPCError, ChatAdminRequired, BadRequest
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message, ChatMemberUpdated
+from pyrogram.errors import RPCError, ChatAdminRequired, BadRequest, Forbidden, FloodWait
+from pyrogram.enums import ChatMemberStatus, ChatType
+from pyrogram.storage import FileStorage
 
 import config
 
 # ---------------- Logging ----------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+# La boucle asyncio ne fait qu'empiler les records dans une file ; le formatage (lazy,
+# style %) et l'écriture se font dans le thread du QueueListener.
+LOG_FIELDS = ("post", "chat_id", "duration_ms", "sent", "skipped")
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler qui n'appelle pas format() dans le thread appelant."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class _RateLimitFilter(logging.Filter):
+    """Limite les WARNING répétés par catégorie ("[autopost]", "[autodelete]"… ou nom du logger)."""
+
+    def __init__(self, burst: int, window_s: float):
+        super().__init__()
+        self.burst = burst
+        self.window_s = window_s
+        self._windows: Dict[str, List[float]] = {}  # cat -> [début, émis, supprimés]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.WARNING:
+            return True
+        msg = record.msg if isinstance(record.msg, str) else ""
+        cat = msg[:msg.index("]") + 1] if msg.startswith("[") and "]" in msg else record.name
+        now = time.monotonic()
+        w = self._windows.get(cat)
+        if w is None or now - w[0] >= self.window_s:
+            if w is not None and w[2]:
+                record.suppressed = int(w[2])
+            self._windows[cat] = [now, 1, 0]
+            return True
+        if w[1] < self.burst:
+            w[1] += 1
+            return True
+        w[2] += 1
+        return False
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{out} (+{suppressed} similaire(s) masqué(s))" if suppressed else out
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        d: Dict[str, Any] = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in LOG_FIELDS + ("suppressed",):
+            value = getattr(record, field, None)
+            if value is not None:
+                d[field] = value
+        if record.exc_info:
+            d["exc"] = self.formatException(record.exc_info)
+        return json.dumps(d, ensure_ascii=False, default=str)
+
+def _setup_logging() -> logging.handlers.QueueListener:
+    stream = logging.StreamHandler()
+    if getattr(config, "LOG_FORMAT", "text") == "json":
+        stream.setFormatter(_JsonFormatter())
+    else:
+        stream.setFormatter(_TextFormatter("%(asctime)s - %(levelname)s - %(message)s"))
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _LazyQueueHandler(q)
+    handler.addFilter(_RateLimitFilter(
+        getattr(config, "LOG_WARN_BURST", 20),
+        getattr(config, "LOG_WARN_WINDOW_S", 60),
+    ))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(logging.INFO)
+    listener = logging.handlers.QueueListener(q, stream)
+    listener.start()
+    return listener
+
+_LOG_LISTENER = _setup_logging()
 logger = logging.getLogger(__name__)
 
 # ---------------- Folders ----------------
 BASE_DIR = Path(__file__).resolve().parent
 SESSION_DIR = BASE_DIR / "session"
 SESSION_DIR.mkdir(parents=True, exist_ok=True)
+MEDIA_DIR = BASE_DIR / "media_cache"
+MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+
+# ---------------- Session Pyrogram (stockage allégé) ----------------
+class BufferedFileStorage(FileStorage):
+    """
+    Session tenue en mémoire et recopiée dans le fichier .session (API backup de sqlite3)
+    périodiquement et à l'arrêt : plus aucun fsync sur le chemin des envois.
+    """
+
+    def __init__(self, name: str, workdir: Path):
+        super().__init__(name, workdir)
+        self.flushes = 0
+        self._last_flush = 0.0
+
+    async def open(self):
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        if self.database.is_file():
+            disk = sqlite3.connect(str(self.database), timeout=1)
+            try:
+                disk.backup(self.conn)
+            finally:
+                disk.close()
+            self.update()
+        else:
+            self.create()
+
+    def flush(self):
+        # update_peers() n'effectue pas de commit : une transaction ouverte bloquerait la copie
+        self.conn.commit()
+        disk = sqlite3.connect(str(self.database), timeout=1)
+        try:
+            self.conn.backup(disk)
+        finally:
+            disk.close()
+        self.flushes += 1
+        self._last_flush = time.monotonic()
+
+    async def save(self):
+        await super().save()
+        # save() sert à l'authentification et à l'arrêt : on persiste, au plus toutes les 5 s
+        if time.monotonic() - self._last_flush >= 5:
+            self.flush()
+
+    async def close(self):
+        self.flush()
+        self.conn.close()
+
+class WALFileStorage(FileStorage):
+    """Session fichier classique, mais en journal WAL avec synchronous=NORMAL."""
+
+    async def open(self):
+        await super().open()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
 
 # ---------------- Pyrogram Client ----------------
 app_1 = Client(
@@ -37,8 +184,23 @@ app_1 = Client(
     bot_token=config.BOT_TOKEN_1,
 )
 
-# ---------------- SQLite (uniquement pour planifier les suppressions) ----------------
-DB_PATH = BASE_DIR / "autopost.sqlite3"
+_SESSION_STORAGE = getattr(config, "SESSION_STORAGE", "buffered")
+if _SESSION_STORAGE == "buffered":
+    app_1.storage = BufferedFileStorage(app_1.name, Path(app_1.workdir))
+elif _SESSION_STORAGE == "wal":
+    app_1.storage = WALFileStorage(app_1.name, Path(app_1.workdir))
+
+# ---------------- SQLite (suppressions planifiées, canaux, santé) ----------------
+DB_PATH = Path(getattr(config, "AUTOPOST_DB_PATH", BASE_DIR / "autopost.sqlite3"))
+
+# Encodage compact du journal d'envois (tout en INTEGER)
+LOG_KIND_SEND = 0
+LOG_KIND_DELETE = 1
+AGG_SCOPE_POST = 0
+AGG_SCOPE_CHANNEL = 1
+# Bornes supérieures (ms) de l'histogramme de latence ; un seau de plus pour le dépassement
+LAT_BUCKETS_MS = (100, 200, 400, 800, 1600, 3200, 6400, 12800, 25600, 51200, 102400)
+_HIST_COLS = [f"h{i}" for i in range(len(LAT_BUCKETS_MS) + 1)]
 
 def db_init():
     with sqlite3.connect(DB_PATH) as con:
@@ -51,6 +213,74 @@ def db_init():
                 delete_at INTEGER NOT NULL
             )
         """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS channel_health (
+                chat_id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL,
+                can_post INTEGER,
+                can_delete INTEGER,
+                fail_count INTEGER NOT NULL DEFAULT 0,
+                next_probe_at INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at INTEGER NOT NULL
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS channels (
+                chat_id INTEGER PRIMARY KEY,
+                title TEXT,
+                type TEXT
+            )
+        """)
+        # Migration : colonnes ajoutées au registre dynamique des canaux
+        cols = {row[1] for row in cur.execute("PRAGMA table_info(channels)")}
+        if "active" not in cols:
+            cur.execute("ALTER TABLE channels ADD COLUMN active INTEGER NOT NULL DEFAULT 1")
+        if "updated_at" not in cols:
+            cur.execute("ALTER TABLE channels ADD COLUMN updated_at INTEGER NOT NULL DEFAULT 0")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_channels_active ON channels(active)")
+        # Journal append-only des envois/suppressions, partitionné par jour (rétention par tranche)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS send_log (
+                day INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                kind INTEGER NOT NULL,
+                post INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                ok INTEGER NOT NULL,
+                latency_ms INTEGER NOT NULL,
+                message_id INTEGER
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_send_log_day ON send_log(day)")
+        # Agrégats journaliers maintenus à l'écriture (par post et par canal)
+        hist_cols = ", ".join(f"h{i} INTEGER NOT NULL DEFAULT 0" for i in range(len(LAT_BUCKETS_MS) + 1))
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS send_agg (
+                day INTEGER NOT NULL,
+                scope INTEGER NOT NULL,
+                key INTEGER NOT NULL,
+                n INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                lat_sum INTEGER NOT NULL DEFAULT 0,
+                lat_max INTEGER NOT NULL DEFAULT 0,
+                {hist_cols},
+                PRIMARY KEY (day, scope, key)
+            ) WITHOUT ROWID
+        """)
+        # Cache des médias distants : validateurs HTTP + file_id Telegram déjà uploadé
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS media_cache (
+                url TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_length INTEGER,
+                sha1 TEXT,
+                checked_at INTEGER NOT NULL,
+                file_id TEXT
+            )
+        """)
         con.commit()
 
 def db_schedule_deletion(chat_id: int, message_id: int, delete_at_ts: int):
@@ -75,6 +305,180 @@ def db_delete_deletion_row(row_id: int):
         con.execute("DELETE FROM deletions WHERE id=?", (row_id,))
         con.commit()
 
+def db_load_channel_health() -> List[Tuple[Any, ...]]:
+    with sqlite3.connect(DB_PATH) as con:
+        cur = con.cursor()
+        cur.execute(
+            "SELECT chat_id, status, can_post, can_delete, fail_count, next_probe_at, last_error, updated_at "
+            "FROM channel_health"
+        )
+        return cur.fetchall()
+
+def db_upsert_channel_health(h: Dict[str, Any]):
+    with sqlite3.connect(DB_PATH) as con:
+        con.execute(
+            "INSERT OR REPLACE INTO channel_health "
+            "(chat_id, status, can_post, can_delete, fail_count, next_probe_at, last_error, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (h["chat_id"], h["status"], h["can_post"], h["can_delete"], h["fail_count"],
+             h["next_probe_at"], h["last_error"], h["updated_at"])
+        )
+        con.commit()
+
+def db_load_media_cache() -> List[Tuple[Any, ...]]:
+    with sqlite3.connect(DB_PATH) as con:
+        cur = con.cursor()
+        cur.execute(
+            "SELECT url, path, etag, last_modified, content_length, sha1, checked_at, file_id FROM media_cache"
+        )
+        return cur.fetchall()
+
+def db_upsert_media(e: Dict[str, Any]):
+    with sqlite3.connect(DB_PATH) as con:
+        con.execute(
+            "INSERT OR REPLACE INTO media_cache "
+            "(url, path, etag, last_modified, content_length, sha1, checked_at, file_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (e["url"], e["path"], e["etag"], e["last_modified"], e["content_length"],
+             e["sha1"], e["checked_at"], e["file_id"])
+        )
+        con.commit()
+
+def db_load_active_channels() -> List[Tuple[int, Optional[str], Optional[str]]]:
+    with sqlite3.connect(DB_PATH) as con:
+        cur = con.cursor()
+        cur.execute("SELECT chat_id, title, type FROM channels WHERE active=1")
+        return cur.fetchall()
+
+def db_upsert_channel(chat_id: int, title: Optional[str], chat_type: Optional[str], active: bool):
+    with sqlite3.connect(DB_PATH) as con:
+        con.execute(
+            "INSERT INTO channels (chat_id, title, type, active, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET "
+            "title=COALESCE(excluded.title, title), type=COALESCE(excluded.type, type), "
+            "active=excluded.active, updated_at=excluded.updated_at",
+            (chat_id, title, chat_type, int(active), int(time.time()))
+        )
+        con.commit()
+
+def _lat_bucket(latency_ms: int) -> int:
+    for i, bound in enumerate(LAT_BUCKETS_MS):
+        if latency_ms <= bound:
+            return i
+    return len(LAT_BUCKETS_MS)
+
+def db_record_sends(entries: List[Tuple[int, int, int, int, bool, int, Optional[int]]]):
+    """
+    Ajoute un lot au journal et met à jour les agrégats dans la même transaction.
+    entries : (ts, kind, post, chat_id, ok, latency_ms, message_id).
+    """
+    if not entries:
+        return
+    aggs: Dict[Tuple[int, int, int], List[int]] = {}
+    log_rows = []
+    for ts, kind, post, chat_id, ok, latency_ms, message_id in entries:
+        day = ts // 86400
+        log_rows.append((day, ts, kind, post, chat_id, int(ok), latency_ms, message_id))
+        if kind != LOG_KIND_SEND:
+            continue
+        for scope, key in ((AGG_SCOPE_POST, post), (AGG_SCOPE_CHANNEL, chat_id)):
+            a = aggs.setdefault((day, scope, key), [0, 0, 0, 0] + [0] * len(_HIST_COLS))
+            a[0] += 1
+            a[1] += 0 if ok else 1
+            a[2] += latency_ms
+            a[3] = max(a[3], latency_ms)
+            a[4 + _lat_bucket(latency_ms)] += 1
+    hist_upd = ", ".join(f"{c}={c}+excluded.{c}" for c in _HIST_COLS)
+    with sqlite3.connect(DB_PATH) as con:
+        con.executemany(
+            "INSERT INTO send_log (day, ts, kind, post, chat_id, ok, latency_ms, message_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            log_rows
+        )
+        con.executemany(
+            f"INSERT INTO send_agg (day, scope, key, n, failed, lat_sum, lat_max, {', '.join(_HIST_COLS)}) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?, {', '.join('?' * len(_HIST_COLS))}) "
+            f"ON CONFLICT(day, scope, key) DO UPDATE SET "
+            f"n=n+excluded.n, failed=failed+excluded.failed, lat_sum=lat_sum+excluded.lat_sum, "
+            f"lat_max=MAX(lat_max, excluded.lat_max), {hist_upd}",
+            [k + tuple(v) for k, v in aggs.items()]
+        )
+        con.commit()
+
+def db_query_send_agg(scope: int, since_day: int) -> List[Tuple[int, ...]]:
+    """Agrégats cumulés par clé depuis since_day : (key, n, failed, lat_sum, lat_max, h0..hN)."""
+    with sqlite3.connect(DB_PATH) as con:
+        cur = con.cursor()
+        cur.execute(
+            f"SELECT key, SUM(n), SUM(failed), SUM(lat_sum), MAX(lat_max), "
+            f"{', '.join(f'SUM({c})' for c in _HIST_COLS)} "
+            f"FROM send_agg WHERE scope=? AND day>=? GROUP BY key",
+            (scope, since_day)
+        )
+        return cur.fetchall()
+
+def db_prune_batch(table: str, sql_where: str, params: Tuple[Any, ...],
+                   key: str = "rowid", batch: int = 1000) -> int:
+    """Supprime au plus `batch` lignes de `table` vérifiant sql_where (transaction courte)."""
+    with sqlite3.connect(DB_PATH) as con:
+        cur = con.execute(
+            f"DELETE FROM {table} WHERE ({key}) IN (SELECT {key} FROM {table} WHERE {sql_where} LIMIT ?)",
+            params + (batch,)
+        )
+        con.commit()
+        return cur.rowcount
+
+def _hist_percentile(hist: List[int], lat_max: int, q: float) -> int:
+    """Percentile approché (borne haute du seau) à partir d'un histogramme de latence."""
+    total = sum(hist)
+    if not total:
+        return 0
+    rank = q * total
+    acc = 0
+    for i, count in enumerate(hist):
+        acc += count
+        if acc >= rank:
+            return min(LAT_BUCKETS_MS[i], lat_max) if i < len(LAT_BUCKETS_MS) else lat_max
+    return lat_max
+
+# ---------------- Maintenance SQLite (vacuum, checkpoint, stats) ----------------
+USERS_DB_PATH = BASE_DIR / "database" / "db.sqlite3"
+
+def db_maintenance_setup(path: Path):
+    """
+    Configure une base pour la maintenance : auto_vacuum INCREMENTAL (nécessite un
+    VACUUM unique si la base existait avant) et journal WAL (persistant).
+    """
+    with sqlite3.connect(path) as con:
+        if con.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            con.execute("VACUUM")
+        con.execute("PRAGMA journal_mode=WAL")
+
+def db_maintenance_run(path: Path, vacuum_pages: int = 2000) -> Dict[str, int]:
+    """Vacuum incrémental, ANALYZE puis checkpoint WAL. Retourne les stats après coup."""
+    with sqlite3.connect(path) as con:
+        # incremental_vacuum libère une page par pas ; executescript le fait tourner jusqu'au bout
+        con.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)});")
+        con.execute("ANALYZE")
+        con.commit()
+        con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return db_storage_stats(path)
+
+def db_storage_stats(path: Path) -> Dict[str, int]:
+    wal = Path(str(path) + "-wal")
+    with sqlite3.connect(path) as con:
+        page_size = con.execute("PRAGMA page_size").fetchone()[0]
+        page_count = con.execute("PRAGMA page_count").fetchone()[0]
+        freelist = con.execute("PRAGMA freelist_count").fetchone()[0]
+    return {
+        "file_bytes": path.stat().st_size if path.exists() else 0,
+        "wal_bytes": wal.stat().st_size if wal.exists() else 0,
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_count": freelist,
+    }
+
 db_init()
 
 # ---------------- Utils ----------------
@@ -89,24 +493,114 @@ def _kb(buttons: Optional[List[Tuple[str, str]]]) -> Optional[InlineKeyboardMark
     rows = [[InlineKeyboardButton(text=txt, url=url)] for (txt, url) in buttons]
     return InlineKeyboardMarkup(rows)
 
-async def _download_if_url(maybe_url: Optional[str]) -> Optional[str]:
-    if not maybe_url:
-        return None
-    s = str(maybe_url)
-    if s.startswith(("http://", "https://")):
+# ---------------- Médias distants (cache + revalidation conditionnelle) ----------------
+_MEDIA: Dict[str, Dict[str, Any]] = {}
+_MEDIA_LOCKS: Dict[str, asyncio.Lock] = {}
+
+def _media_load():
+    for url, path, etag, last_modified, content_length, sha1, checked_at, file_id in db_load_media_cache():
+        _MEDIA[url] = {
+            "url": url,
+            "path": path,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_length": content_length,
+            "sha1": sha1,
+            "checked_at": checked_at,
+            "file_id": file_id,
+        }
+
+def _media_fetch_sync(url: str, prev: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    GET conditionnel (If-None-Match / If-Modified-Since) si une copie locale existe.
+    304 -> on garde fichier et file_id ; 200 -> nouveau fichier, file_id invalidé
+    sauf si le contenu est identique (même sha1). Bloquant : à lancer dans un thread.
+    """
+    headers = {"User-Agent": "Mozilla/5.0"}
+    if prev:
+        if prev["etag"]:
+            headers["If-None-Match"] = prev["etag"]
+        if prev["last_modified"]:
+            headers["If-Modified-Since"] = prev["last_modified"]
+    req = urllib.request.Request(url, headers=headers)
+    ssl_ctx = ssl.create_default_context(cafile=certifi.where())
+    now = int(time.time())
+    try:
+        # Revalidation courte : en cas d'échec on sert la copie locale, inutile d'attendre
+        timeout = (getattr(config, "MEDIA_REVALIDATE_TIMEOUT_S", 10) if prev
+                   else getattr(config, "MEDIA_DOWNLOAD_TIMEOUT_S", 120))
+        resp = urllib.request.urlopen(req, timeout=timeout, context=ssl_ctx)
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and prev:
+            return dict(prev, checked_at=now)
+        raise
+    with resp:
+        final_path = MEDIA_DIR / (hashlib.sha1(url.encode()).hexdigest() + Path(url).suffix)
+        fd, tmp = tempfile.mkstemp(prefix="ap_dl_", dir=MEDIA_DIR)
+        digest = hashlib.sha1()
         try:
-            req = urllib.request.Request(s, headers={"User-Agent": "Mozilla/5.0"})
-            ssl_ctx = ssl.create_default_context(cafile=certifi.where())
-            with urllib.request.urlopen(req, timeout=120, context=ssl_ctx) as resp:
-                suffix = Path(s).suffix or ""
-                fd, temp_path = tempfile.mkstemp(prefix="ap_dl_", suffix=suffix)
-                with os.fdopen(fd, "wb") as f:
-                    f.write(resp.read())
-            return temp_path
+            with os.fdopen(fd, "wb") as f:
+                while chunk := resp.read(256 * 1024):
+                    digest.update(chunk)
+                    f.write(chunk)
+            os.replace(tmp, final_path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        length = resp.headers.get("Content-Length")
+        sha1 = digest.hexdigest()
+        return {
+            "url": url,
+            "path": str(final_path),
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "content_length": int(length) if length and length.isdigit() else None,
+            "sha1": sha1,
+            "checked_at": now,
+            "file_id": prev["file_id"] if prev and prev["sha1"] == sha1 else None,
+        }
+
+async def _media_get(url: str) -> Optional[Dict[str, Any]]:
+    """
+    Entrée de cache pour une URL média, revalidée au plus toutes les MEDIA_REVALIDATE_EVERY_S.
+    En cas d'échec réseau, on sert la copie locale existante et on ne réessaie
+    qu'après MEDIA_RETRY_AFTER_S (les autres canaux du fan-out n'attendent pas).
+    """
+    lock = _MEDIA_LOCKS.setdefault(url, asyncio.Lock())
+    async with lock:
+        entry = _MEDIA.get(url)
+        if entry and not os.path.exists(entry["path"]):
+            entry = None
+        every_s = getattr(config, "MEDIA_REVALIDATE_EVERY_S", 3600)
+        if entry and time.time() - entry["checked_at"] < every_s:
+            return entry
+        try:
+            fresh = await asyncio.to_thread(_media_fetch_sync, url, entry)
         except Exception as e:
-            logger.warning(f"Téléchargement media KO {s}: {e}")
-            return None
-    return s
+            logger.warning("[media] Téléchargement KO %s: %s", url, e)
+            if entry:
+                # Prochain essai dans MEDIA_RETRY_AFTER_S plutôt qu'au prochain envoi
+                retry_s = min(every_s, getattr(config, "MEDIA_RETRY_AFTER_S", 300))
+                entry["checked_at"] = int(time.time()) - every_s + retry_s
+                db_upsert_media(entry)
+            return entry
+        if entry is None or fresh["sha1"] != entry["sha1"]:
+            logger.info("[media] %s %s (%s octets)", "Mis à jour" if entry else "Téléchargé", url,
+                        fresh["content_length"])
+        _MEDIA[url] = fresh
+        db_upsert_media(fresh)
+        return fresh
+
+def _is_stale_file_ref(e: BadRequest) -> bool:
+    """Erreur Telegram indiquant que le file_id mis en cache n'est plus réutilisable."""
+    err_id = getattr(e, "ID", "") or ""
+    return err_id.startswith("FILE_REFERENCE_") or err_id in ("FILE_ID_INVALID", "MEDIA_EMPTY")
+
+def _media_set_file_id(url: str, file_id: Optional[str]):
+    entry = _MEDIA.get(url)
+    if entry and entry["file_id"] != file_id:
+        entry["file_id"] = file_id
+        db_upsert_media(entry)
 
 def _seconds_until_next_weekly(weekday_idx: int, hour: int, minute: int, tz_str: str) -> float:
     tz = ZoneInfo(tz_str)
@@ -139,9 +633,284 @@ async def _resolve_chat_id(chat_ref: int | str) -> Optional[int]:
             return chat.id
         return int(chat_ref)
     except Exception as e:
-        logger.warning(f"[resolve] Impossible de résoudre {chat_ref}: {e}")
+        logger.warning("[resolve] Impossible de résoudre %s: %s", chat_ref, e)
         return None
 
+# ---------------- Dispatcher RPC (voies prioritaires) ----------------
+# Un seul client, un seul budget d'appels : tout passe par une file à priorités.
+# Voie la plus prioritaire d'abord, puis échéance la plus proche (EDF) dans la voie.
+LANE_SEND = 0    # envois planifiés, échéance = heure du créneau
+LANE_ADMIN = 1   # /force_post_index, /resolve
+LANE_PROBE = 2   # préflight et re-tests de santé
+LANE_DELETE = 3  # suppressions planifiées : absorbent la capacité restante
+_LANE_NAMES = {LANE_SEND: "send", LANE_ADMIN: "admin", LANE_PROBE: "probe", LANE_DELETE: "delete"}
+RPC_MIN_INTERVAL_S = getattr(config, "RPC_MIN_INTERVAL_S", 0.25)  # écart mini entre deux appels
+RPC_FLOODWAIT_RETRIES = getattr(config, "RPC_FLOODWAIT_RETRIES", 2)
+
+_RPC_QUEUE: List[Tuple[int, float, int, float, asyncio.Future, Callable[[], Awaitable[Any]]]] = []
+_RPC_SEQ = itertools.count()
+_RPC_WAKE = asyncio.Event()
+_LANE_WAITS: Dict[int, deque] = {lane: deque(maxlen=500) for lane in _LANE_NAMES}  # attentes (s)
+_LANE_DONE: Dict[int, int] = {lane: 0 for lane in _LANE_NAMES}
+_RPC_FLOOD_RETRIES: Dict[int, int] = {}  # seq -> remises en file après FloodWait
+
+async def _rpc_timed(lane: int, call: Callable[[], Awaitable[Any]],
+                     deadline: Optional[float] = None) -> Tuple[Any, float]:
+    """
+    Met un appel Telegram en file et attend (résultat, durée d'exécution en s).
+    La durée exclut l'attente en file et la pause du dispatcher ; en cas d'échec,
+    elle est portée par l'exception (attribut rpc_exec_s).
+    """
+    fut = asyncio.get_running_loop().create_future()
+    heapq.heappush(_RPC_QUEUE, (lane, deadline if deadline is not None else float("inf"),
+                                next(_RPC_SEQ), time.monotonic(), fut, call))
+    _RPC_WAKE.set()
+    return await fut
+
+async def _rpc(lane: int, call: Callable[[], Awaitable[Any]], deadline: Optional[float] = None) -> Any:
+    """Met un appel Telegram en file et attend son résultat (ou son exception)."""
+    result, _ = await _rpc_timed(lane, call, deadline)
+    return result
+
+async def _rpc_dispatcher():
+    """
+    Exécute les appels un par un, dans l'ordre (voie, échéance), espacés de RPC_MIN_INTERVAL_S.
+    Un FloodWait met toutes les voies en pause puis remet l'appel en file (RPC_FLOODWAIT_RETRIES fois).
+    """
+    while True:
+        if not _RPC_QUEUE:
+            _RPC_WAKE.clear()
+            _heartbeat("rpc_dispatcher", 600)
+            try:
+                await asyncio.wait_for(_RPC_WAKE.wait(), 600)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        item = heapq.heappop(_RPC_QUEUE)
+        lane, _, seq, enqueued, fut, call = item
+        if fut.done():  # appelant annulé entre-temps
+            _RPC_FLOOD_RETRIES.pop(seq, None)
+            continue
+        if seq not in _RPC_FLOOD_RETRIES:
+            _LANE_WAITS[lane].append(time.monotonic() - enqueued)
+        _heartbeat("rpc_dispatcher", 600)
+        pause = RPC_MIN_INTERVAL_S
+        t0 = time.perf_counter()
+        try:
+            result = await call()
+        except FloodWait as e:
+            # Budget global épuisé : toutes les voies attendent, puis l'appel repasse à sa place
+            pause = max(pause, float(getattr(e, "value", 0) or 0))
+            e.rpc_exec_s = time.perf_counter() - t0
+            tries = _RPC_FLOOD_RETRIES.get(seq, 0)
+            if tries < RPC_FLOODWAIT_RETRIES and not fut.done():
+                _RPC_FLOOD_RETRIES[seq] = tries + 1
+                heapq.heappush(_RPC_QUEUE, item)
+                logger.warning("[rpc] FloodWait %.0fs (voie %s), appel remis en file (%d/%d)",
+                               pause, _LANE_NAMES[lane], tries + 1, RPC_FLOODWAIT_RETRIES)
+                _heartbeat("rpc_dispatcher", pause)
+                await asyncio.sleep(pause)
+                continue
+            if not fut.done():
+                fut.set_exception(e)
+        except Exception as e:
+            e.rpc_exec_s = time.perf_counter() - t0
+            if not fut.done():
+                fut.set_exception(e)
+        else:
+            if not fut.done():
+                fut.set_result((result, time.perf_counter() - t0))
+        _RPC_FLOOD_RETRIES.pop(seq, None)
+        _LANE_DONE[lane] += 1
+        _heartbeat("rpc_dispatcher", pause)
+        await asyncio.sleep(pause)
+
+def _lane_stats() -> List[Tuple[str, int, int, float, float, float]]:
+    """(voie, traités, en file, attente p50, p95, max) — attentes en secondes."""
+    queued = {lane: 0 for lane in _LANE_NAMES}
+    for item in _RPC_QUEUE:
+        if not item[4].done():
+            queued[item[0]] += 1
+    out = []
+    for lane, name in _LANE_NAMES.items():
+        waits = sorted(_LANE_WAITS[lane])
+        if waits:
+            p50, p95, mx = waits[len(waits) // 2], waits[min(len(waits) - 1, int(len(waits) * 0.95))], waits[-1]
+        else:
+            p50 = p95 = mx = 0.0
+        out.append((name, _LANE_DONE[lane], queued[lane], p50, p95, mx))
+    return out
+
+# ---------------- Santé des canaux (droits de publication) ----------------
+HEALTH_OK = "ok"                # le bot peut publier
+HEALTH_NO_RIGHTS = "no_rights"  # rétrogradé / pas can_post_messages
+HEALTH_GONE = "gone"            # bot retiré, banni ou canal inaccessible
+HEALTH_ERROR = "error"          # erreur transitoire -> backoff puis nouvel essai
+
+_CHANNEL_HEALTH: Dict[int, Dict[str, Any]] = {}
+_ME_ID: Optional[int] = None
+
+def _health_load():
+    """Recharge le registre persistant (autopost.sqlite3) en mémoire."""
+    for chat_id, status, can_post, can_delete, fail_count, next_probe_at, last_error, updated_at in db_load_channel_health():
+        _CHANNEL_HEALTH[chat_id] = {
+            "chat_id": chat_id,
+            "status": status,
+            "can_post": can_post,
+            "can_delete": can_delete,
+            "fail_count": fail_count,
+            "next_probe_at": next_probe_at,
+            "last_error": last_error,
+            "updated_at": updated_at,
+        }
+
+def _health_set(chat_id: int, status: str, can_post: Optional[bool] = None,
+                can_delete: Optional[bool] = None, error: Optional[str] = None):
+    """
+    Met à jour l'état d'un canal. Hors HEALTH_OK, le prochain re-test est repoussé
+    avec un backoff exponentiel. N'écrit en base que si l'état change.
+    Un canal HEALTH_GONE (event, préflight, re-test ou erreur d'envoi) sort du registre.
+    """
+    now = int(time.time())
+    prev = _CHANNEL_HEALTH.get(chat_id)
+    if status == HEALTH_OK:
+        fail_count, next_probe_at = 0, 0
+    else:
+        fail_count = (prev["fail_count"] if prev else 0) + 1
+        base = getattr(config, "HEALTH_BACKOFF_BASE_S", 60)
+        cap = getattr(config, "HEALTH_BACKOFF_MAX_S", 6 * 3600)
+        next_probe_at = now + int(min(cap, base * 2 ** (fail_count - 1)))
+    h = {
+        "chat_id": chat_id,
+        "status": status,
+        "can_post": None if can_post is None else int(can_post),
+        "can_delete": None if can_delete is None else int(can_delete),
+        "fail_count": fail_count,
+        "next_probe_at": next_probe_at,
+        "last_error": error,
+        "updated_at": now,
+    }
+    if prev and status == HEALTH_OK and prev["status"] == HEALTH_OK:
+        # Chemin chaud (envoi réussi) : rien de neuf, on garde les droits connus
+        if can_post is None and can_delete is None:
+            return
+        if (h["can_post"], h["can_delete"]) == (prev["can_post"], prev["can_delete"]):
+            return
+    _CHANNEL_HEALTH[chat_id] = h
+    if not prev or prev["status"] != status:
+        logger.info("[health] %s: %s -> %s (%s)", chat_id, prev["status"] if prev else "?", status, error or "-",
+                    extra={"chat_id": chat_id})
+    db_upsert_channel_health(h)
+    if status == HEALTH_GONE:
+        _channel_remove(chat_id)
+
+def _health_is_sendable(chat_id: int) -> bool:
+    """Vrai si le fan-out doit tenter ce canal maintenant."""
+    h = _CHANNEL_HEALTH.get(chat_id)
+    if h is None or h["status"] == HEALTH_OK:
+        return True
+    if h["status"] == HEALTH_ERROR:
+        # Erreur transitoire : on retente une fois le backoff écoulé
+        return time.time() >= h["next_probe_at"]
+    # no_rights / gone : uniquement après re-test ou event chat_member
+    return False
+
+def _health_from_member(chat_type: Any, member: Any) -> Tuple[str, Optional[bool], Optional[bool]]:
+    """Déduit (status, can_post, can_delete) d'un ChatMember du bot."""
+    privileges = getattr(member, "privileges", None)
+    can_post = getattr(privileges, "can_post_messages", None)
+    can_delete = getattr(privileges, "can_delete_messages", None)
+    status = getattr(member, "status", None)
+    if status in (ChatMemberStatus.LEFT, ChatMemberStatus.BANNED):
+        return HEALTH_GONE, can_post, can_delete
+    is_admin = status in (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER)
+    if can_post is False or (chat_type == ChatType.CHANNEL and not is_admin):
+        return HEALTH_NO_RIGHTS, can_post, can_delete
+    return HEALTH_OK, can_post, can_delete
+
+async def _probe_channel(chat_ref: int | str, lane: int = LANE_PROBE) -> Optional[Tuple[Any, str]]:
+    """
+    Teste l'accès et les droits du bot sur un canal, met à jour le registre de santé.
+    Retourne (chat, status) ou None si le canal est inaccessible.
+    """
+    try:
+        chat = await _rpc(lane, lambda: app_1.get_chat(chat_ref))
+    except (BadRequest, Forbidden) as e:
+        if isinstance(chat_ref, int) or str(chat_ref).lstrip("-").isdigit():
+            _health_set(int(chat_ref), HEALTH_GONE, error=str(e))
+        logger.warning("[health] Accès impossible à %s: %s", chat_ref, e)
+        return None
+    except Exception as e:
+        if isinstance(chat_ref, int) or str(chat_ref).lstrip("-").isdigit():
+            _health_set(int(chat_ref), HEALTH_ERROR, error=str(e))
+        logger.warning("[health] Accès impossible à %s: %s", chat_ref, e)
+        return None
+    try:
+        member = await _rpc(lane, lambda: app_1.get_chat_member(chat.id, _ME_ID or "me"))
+        status, can_post, can_delete = _health_from_member(chat.type, member)
+        _health_set(chat.id, status, can_post=can_post, can_delete=can_delete)
+        logger.info("[health] %s (%s) -> %s can_post=%s can_delete=%s", chat.title, chat.id, status, can_post, can_delete,
+                    extra={"chat_id": chat.id})
+    except Exception as e:
+        status = HEALTH_ERROR
+        _health_set(chat.id, status, error=str(e))
+        logger.warning("[health] Impossible de lire les droits sur %s: %s", chat.id, e, extra={"chat_id": chat.id})
+    return chat, status
+
+def _health_note_send_error(chat_id: int, e: Exception):
+    """Classe une erreur d'envoi : droits, canal perdu, ou transitoire."""
+    if isinstance(e, FloodWait):
+        return  # limite globale, pas un problème du canal
+    if isinstance(e, (ChatAdminRequired, Forbidden)):
+        _health_set(chat_id, HEALTH_NO_RIGHTS, can_post=False, error=str(e))
+    elif isinstance(e, BadRequest):
+        if getattr(e, "ID", "") in ("CHANNEL_PRIVATE", "CHANNEL_INVALID", "CHAT_ID_INVALID", "PEER_ID_INVALID"):
+            _health_set(chat_id, HEALTH_GONE, error=str(e))
+        # autres BadRequest : problème du post (média, texte…), pas du canal
+    elif isinstance(e, RPCError):
+        _health_set(chat_id, HEALTH_ERROR, error=str(e))
+
+# ---------------- Registre dynamique des canaux ----------------
+# Source de vérité : table `channels` (autopost.sqlite3), alimentée par les events
+# chat_member (promotion / retrait du bot). config.CHANNEL_IDS ne sert plus que de graine.
+_CHANNELS: Dict[int, Dict[str, Any]] = {}
+_CHANNELS_ORDER: Optional[Tuple[int, ...]] = None  # cache trié pour le fan-out
+
+def _channels_load():
+    """Charge les canaux actifs en mémoire."""
+    global _CHANNELS_ORDER
+    _CHANNELS.clear()
+    for chat_id, title, chat_type in db_load_active_channels():
+        _CHANNELS[chat_id] = {"title": title, "type": chat_type}
+    _CHANNELS_ORDER = None
+
+def _channel_add(chat_id: int, title: Optional[str] = None, chat_type: Any = None):
+    global _CHANNELS_ORDER
+    type_str = getattr(chat_type, "name", chat_type)
+    known = _CHANNELS.get(chat_id)
+    if known and known["title"] == title and known["type"] == type_str:
+        return
+    if not known:
+        logger.info("[channels] + %s (%s)", chat_id, title, extra={"chat_id": chat_id})
+        _CHANNELS_ORDER = None
+    _CHANNELS[chat_id] = {"title": title, "type": type_str}
+    db_upsert_channel(chat_id, title, type_str, True)
+
+def _channel_remove(chat_id: int):
+    global _CHANNELS_ORDER
+    if _CHANNELS.pop(chat_id, None) is None:
+        return
+    logger.info("[channels] - %s", chat_id, extra={"chat_id": chat_id})
+    _CHANNELS_ORDER = None
+    db_upsert_channel(chat_id, None, None, False)
+
+def _channels_snapshot() -> Tuple[int, ...]:
+    """IDs actifs dans un ordre stable ; figé pour la durée d'un fan-out."""
+    global _CHANNELS_ORDER
+    if _CHANNELS_ORDER is None:
+        _CHANNELS_ORDER = tuple(sorted(_CHANNELS))
+    return _CHANNELS_ORDER
+
 # ---------------- Messages (TOUT est ici) ----------------
 MESSAGES: List[Dict[str, Any]] = [
     {
@@ -594,11 +1363,15 @@ MESSAGES: List[Dict[str, Any]] = [
     },
 ]
 
+_POST_INDEX: Dict[str, int] = {p["name"]: i for i, p in enumerate(MESSAGES)}
+
 # ---------------- Envoi d’un post vers 1 canal ----------------
-async def _send_autopost_to_chat(chat_ref: int | str, post_cfg: Dict[str, Any]) -> Optional[int]:
+async def _send_autopost_to_chat(chat_ref: int | str, post_cfg: Dict[str, Any],
+                                 lane: int = LANE_SEND, deadline: Optional[float] = None) -> Tuple[Optional[int], int]:
     """
     Envoie un post vers chat_ref (int -100... ou @username).
-    Résout d'abord l'ID numérique.
+    Résout d'abord l'ID numérique. L'appel passe par le dispatcher (voie + échéance).
+    Retourne (message_id ou None, durée d'exécution de l'appel Telegram en ms).
     """
     ptype = (post_cfg.get("type") or "text").lower()
     media = post_cfg.get("media")
@@ -608,73 +1381,331 @@ async def _send_autopost_to_chat(chat_ref: int | str, post_cfg: Dict[str, Any])
 
     chat_id = await _resolve_chat_id(chat_ref)
     if chat_id is None:
-        logger.warning(f"[autopost] Résolution chat KO pour {chat_ref}")
-        return None
+        logger.warning("[autopost] Résolution chat KO pour %s", chat_ref, extra={"post": post_cfg["name"]})
+        return None, 0
 
-    temp_path = None
+    exec_s = 0.0
+    media_url = None
+    used_file_id = False
     try:
-        media_path = None
-        if ptype in ("photo", "video", "voice", "document"):
-            media_path = await _download_if_url(media)
-            if media_path and os.path.isabs(media_path):
-                temp_path = media_path
-
-        if ptype == "text":
-            m = await app_1.send_message(chat_id, text or " ", reply_markup=markup)
-        elif ptype == "photo":
-            m = await app_1.send_photo(chat_id, photo=(media_path or media), caption=text or None, reply_markup=markup)
-        elif ptype == "video":
-            m = await app_1.send_video(chat_id, video=(media_path or media), caption=text or None, reply_markup=markup, supports_streaming=True)
-        elif ptype == "voice":
-            m = await app_1.send_voice(chat_id, voice=(media_path or media), caption=text or None, reply_markup=markup)
-        elif ptype == "document":
-            m = await app_1.send_document(chat_id, document=(media_path or media), caption=text or None, reply_markup=markup)
-        else:
-            m = await app_1.send_message(chat_id, text or " ", reply_markup=markup)
+        media_src = media
+        if ptype in ("photo", "video", "voice", "document") and str(media or "").startswith(("http://", "https://")):
+            entry = await _media_get(str(media))
+            if entry:
+                # file_id déjà uploadé si dispo, sinon le fichier local (Telegram récupère l'URL en dernier recours)
+                media_url = entry["url"]
+                used_file_id = bool(entry["file_id"])
+                media_src = entry["file_id"] or entry["path"]
+
+        def _call_for(src: Any) -> Callable[[], Awaitable[Any]]:
+            if ptype == "photo":
+                return lambda: app_1.send_photo(chat_id, photo=src, caption=text or None, reply_markup=markup)
+            if ptype == "video":
+                return lambda: app_1.send_video(chat_id, video=src, caption=text or None, reply_markup=markup, supports_streaming=True)
+            if ptype == "voice":
+                return lambda: app_1.send_voice(chat_id, voice=src, caption=text or None, reply_markup=markup)
+            if ptype == "document":
+                return lambda: app_1.send_document(chat_id, document=src, caption=text or None, reply_markup=markup)
+            return lambda: app_1.send_message(chat_id, text or " ", reply_markup=markup)
+
+        try:
+            m, exec_s = await _rpc_timed(lane, _call_for(media_src), deadline)
+        except BadRequest as e:
+            if not (used_file_id and _is_stale_file_ref(e)):
+                raise
+            # Référence d'upload expirée/invalide : on l'oublie et on renvoie une fois depuis le fichier local
+            logger.info("[media] file_id refusé (%s), ré-upload de %s", e.ID, media_url, extra={"chat_id": chat_id})
+            _media_set_file_id(media_url, None)
+            used_file_id = False
+            m, exec_s = await _rpc_timed(lane, _call_for(entry["path"]), deadline)
 
-        return m.id
-    except ChatAdminRequired:
-        logger.warning(f"[autopost] Pas les droits dans {chat_id} (publier/supprimer).")
+        if media_url and not used_file_id:
+            sent_media = getattr(m, ptype, None)
+            if sent_media is not None:
+                _media_set_file_id(media_url, sent_media.file_id)
+        _health_set(chat_id, HEALTH_OK)
+        return m.id, int(exec_s * 1000)
+    except ChatAdminRequired as e:
+        exec_s = getattr(e, "rpc_exec_s", exec_s)
+        _health_note_send_error(chat_id, e)
+        logger.warning("[autopost] Pas les droits dans %s (publier/supprimer).", chat_id,
+                       extra={"post": post_cfg["name"], "chat_id": chat_id})
     except BadRequest as e:
-        logger.warning(f"[autopost] BadRequest {chat_id}: {e}")
+        exec_s = getattr(e, "rpc_exec_s", exec_s)
+        _health_note_send_error(chat_id, e)
+        logger.warning("[autopost] BadRequest %s: %s", chat_id, e, extra={"post": post_cfg["name"], "chat_id": chat_id})
     except RPCError as e:
-        logger.warning(f"[autopost] RPCError {chat_id}: {e}")
+        exec_s = getattr(e, "rpc_exec_s", exec_s)
+        _health_note_send_error(chat_id, e)
+        logger.warning("[autopost] RPCError %s: %s", chat_id, e, extra={"post": post_cfg["name"], "chat_id": chat_id})
     except Exception as e:
-        logger.warning(f"[autopost] Unexpected {chat_id}: {e}")
+        exec_s = getattr(e, "rpc_exec_s", exec_s)
+        logger.warning("[autopost] Unexpected %s: %s", chat_id, e, extra={"post": post_cfg["name"], "chat_id": chat_id})
+    return None, int(exec_s * 1000)
+
+# ---------------- Supervision des tâches de fond ----------------
+# Chaque worker tourne sous _supervise() : redémarrage avec backoff en cas d'exception,
+# battements de cœur (_heartbeat) pour la vue liveness / readiness (/status).
+_TASKS: Dict[str, Dict[str, Any]] = {}
+_READY = False  # passe à True une fois le préflight terminé
+
+def _heartbeat(name: str, expect_next_s: float = 0, ran: bool = False):
+    """Signale que `name` est vivant ; expect_next_s = délai max avant le prochain battement."""
+    t = _TASKS.get(name)
+    if t is None:
+        return
+    now = time.time()
+    t["last_beat"] = now
+    t["expect_next_s"] = expect_next_s
+    if ran:
+        t["last_run"] = now
+
+def _supervise(name: str, factory: Callable[[], Awaitable[None]]):
+    _TASKS[name] = {
+        "state": "starting",
+        "restarts": 0,
+        "started_at": 0.0,
+        "last_beat": 0.0,
+        "expect_next_s": 0.0,
+        "last_run": None,
+        "last_error": None,
+        "task": None,
+    }
+    _TASKS[name]["task"] = asyncio.create_task(_supervisor_loop(name, factory), name=name)
+
+async def _supervisor_loop(name: str, factory: Callable[[], Awaitable[None]]):
+    t = _TASKS[name]
+    base = getattr(config, "SUPERVISOR_BACKOFF_BASE_S", 5)
+    cap = getattr(config, "SUPERVISOR_BACKOFF_MAX_S", 600)
+    backoff = base
+    while True:
+        t["state"] = "running"
+        t["started_at"] = time.time()
+        _heartbeat(name)
+        try:
+            await factory()
+            t["state"] = "finished"
+            logger.info("[supervisor] %s terminé.", name)
+            return
+        except asyncio.CancelledError:
+            t["state"] = "cancelled"
+            raise
+        except Exception as e:
+            t["restarts"] += 1
+            t["last_error"] = f"{type(e).__name__}: {e}"
+            if time.time() - t["started_at"] > 10 * cap:
+                backoff = base  # a tourné longtemps : on repart du délai minimal
+            t["state"] = "backoff"
+            logger.error("[supervisor] %s a planté (%s), redémarrage dans %ds", name, t["last_error"], backoff,
+                         exc_info=True)
+            await asyncio.sleep(backoff)
+            backoff = min(cap, backoff * 2)
+
+def _task_is_stale(t: Dict[str, Any], now: float) -> bool:
+    grace = getattr(config, "SUPERVISOR_GRACE_S", 120)
+    return t["state"] == "running" and now > t["last_beat"] + t["expect_next_s"] + grace
+
+def _liveness() -> Dict[str, Any]:
+    """Vue liveness / readiness : tâches plantées, en backoff ou sans battement récent."""
+    now = time.time()
+    dead = [n for n, t in _TASKS.items() if t["state"] in ("backoff", "cancelled")]
+    stale = [n for n, t in _TASKS.items() if _task_is_stale(t, now)]
+    alive = not dead and not stale
+    connected = bool(getattr(app_1, "is_connected", False))
+    return {
+        "alive": alive,
+        "ready": alive and connected and _READY and bool(_CHANNELS),
+        "connected": connected,
+        "dead": dead,
+        "stale": stale,
+    }
+
+async def _supervisor_watchdog():
+    """Signale périodiquement les tâches mortes ou muettes (le débit ne doit pas tomber à zéro)."""
+    while True:
+        _heartbeat("watchdog", 60)
+        await asyncio.sleep(60)
+        view = _liveness()
+        if view["dead"] or view["stale"]:
+            logger.warning("[supervisor] Tâches en échec: %s, sans battement: %s", view["dead"], view["stale"])
+
+# ---------------- Fan-out ----------------
+# Fan-outs en cours : id -> canaux restant à traiter (maintenance et budgets de heartbeat)
+_FANOUTS_IN_FLIGHT: Dict[int, int] = {}
+_FANOUT_IDS = itertools.count()
+
+async def _broadcast_post(post_cfg: Dict[str, Any], lane: int = LANE_SEND,
+                          deadline: Optional[float] = None) -> Tuple[int, int]:
+    """
+    Envoie un post dans tous les canaux actifs et sains, et planifie les suppressions.
+    Le rythme est donné par le dispatcher RPC. Retourne (envoyés, ignorés car en mauvaise santé).
+    """
+    tz = ZoneInfo(config.TIMEZONE)
+    post_idx = _POST_INDEX.get(post_cfg["name"], -1)
+    sent = skipped = 0
+    log: List[Tuple[int, int, int, int, bool, int, Optional[int]]] = []
+    channels = _channels_snapshot()
+    fanout_id = next(_FANOUT_IDS)
+    _FANOUTS_IN_FLIGHT[fanout_id] = len(channels)
+    try:
+        for i, chat_id in enumerate(channels, 1):
+            _FANOUTS_IN_FLIGHT[fanout_id] = len(channels) - i + 1
+            if not _health_is_sendable(chat_id):
+                skipped += 1
+                continue
+            # Latence = exécution de l'appel seule (hors file d'attente et pause du dispatcher)
+            mid, latency_ms = await _send_autopost_to_chat(chat_id, post_cfg, lane, deadline)
+            log.append((int(time.time()), LOG_KIND_SEND, post_idx, chat_id, bool(mid), latency_ms, mid))
+            if mid:
+                sent += 1
+                delete_at = int((datetime.now(tz) + timedelta(days=config.AUTO_DELETE_AFTER_DAYS)).timestamp())
+                try:
+                    db_schedule_deletion(chat_id, mid, delete_at)
+                except Exception as e:
+                    logger.warning("[autopost] Planification suppression %s:%s KO: %s", chat_id, mid, e,
+                                   extra={"chat_id": chat_id})
     finally:
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except Exception:
-                pass
-    return None
+        _FANOUTS_IN_FLIGHT.pop(fanout_id, None)
+    try:
+        db_record_sends(log)
+    except Exception as e:
+        logger.warning("[sendlog] Écriture du journal KO: %s", e)
+    return sent, skipped
+
+# ---------------- Analyse de charge du planning ----------------
+# Latence par envoi (ms) supposée tant que le journal n'a pas de mesure pour le post
+_DEFAULT_SEND_MS = {"text": 400, "photo": 1500, "video": 6000, "voice": 1500, "document": 2000}
+_FR_WEEKDAY_NAMES = {v: k for k, v in _FR_WEEKDAYS.items()}
+
+def _fmt_week_s(week_s: float) -> str:
+    week_s = int(week_s) % (7 * 86400)
+    return f"{_FR_WEEKDAY_NAMES[week_s // 86400]} {week_s % 86400 // 3600:02d}:{week_s % 3600 // 60:02d}"
+
+def _analyse_schedule(n_channels: Optional[int] = None, history_days: int = 14) -> Dict[str, Any]:
+    """
+    Croise le planning compilé, le nombre de canaux et la latence mesurée (send_agg) pour
+    prédire la durée de chaque fan-out, ses heures de début/fin réelles dans la file série
+    du dispatcher (retards en cascade) et le pic d'appels RPC par minute.
+    """
+    if n_channels is None:
+        n_channels = sum(1 for cid in _channels_snapshot() if _health_is_sendable(cid))
+    since_day = int(time.time()) // 86400 - history_days + 1
+    measured = {row[0]: row[3] / row[1] for row in db_query_send_agg(AGG_SCOPE_POST, since_day) if row[1]}
+    errors: List[str] = []
+    slots: List[Dict[str, Any]] = []
+    for idx, p in enumerate(MESSAGES):
+        try:
+            wd, h, m = _resolve_schedule_tuple(p["schedule_var"])
+        except ValueError as e:
+            errors.append(f"{p['name']}: {e}")
+            continue
+        send_ms = measured.get(idx) or _DEFAULT_SEND_MS.get((p.get("type") or "text").lower(), 1000)
+        per_channel_s = send_ms / 1000 + RPC_MIN_INTERVAL_S
+        slots.append({
+            "name": p["name"],
+            "start": (wd * 1440 + h * 60 + m) * 60,
+            "per_channel_s": per_channel_s,
+            "duration": n_channels * per_channel_s,
+            "measured": idx in measured,
+        })
+    slots.sort(key=lambda x: x["start"])
+
+    week = 7 * 86400
+    max_channels: Optional[int] = None
+    for i, a in enumerate(slots):
+        if len(slots) < 2:
+            break
+        b = slots[(i + 1) % len(slots)]
+        gap = b["start"] - a["start"] + (week if i + 1 == len(slots) else 0)
+        cap = int(gap / a["per_channel_s"])
+        max_channels = cap if max_channels is None else min(max_channels, cap)
+
+    # Le dispatcher sert les fan-outs l'un après l'autre (EDF) : on rejoue la file série sur
+    # deux semaines pour que le retard du dimanche se reporte sur le lundi, et on garde la 2e.
+    saturated = sum(a["duration"] for a in slots) >= week
+    delays: List[Tuple[str, str, float, float]] = []  # (post retardé, post devant, retard en s, fin prévue)
+    runs: List[Tuple[float, float, float]] = []  # (début réel, fin, envois/s)
+    t_free, prev = float("-inf"), None
+    for w in (0, 1):
+        for a in slots:
+            start = a["start"] + w * week
+            actual = max(start, t_free)
+            end = actual + a["duration"]
+            if w:
+                a["actual_start"], a["end"] = actual - week, end - week
+                if actual > start and prev is not None:
+                    delays.append((a["name"], prev, actual - start, end - week))
+                if a["duration"]:
+                    runs.append((actual - week, end - week, 1 / a["per_channel_s"]))
+            t_free, prev = end, a["name"]
+
+    # Envois série : au plus 1/per_channel_s par seconde -> charge par minute de la semaine
+    per_minute: Dict[int, float] = {}
+    for t, end, rate in runs:
+        while t < end:
+            minute = int(t // 60)
+            chunk = min(end, (minute + 1) * 60) - t
+            key = minute % (7 * 1440)
+            per_minute[key] = per_minute.get(key, 0.0) + rate * chunk
+            t += chunk
+    peak_minute, peak_rpm = max(per_minute.items(), key=lambda kv: kv[1], default=(0, 0.0))
+    return {
+        "n_channels": n_channels,
+        "slots": slots,
+        "errors": errors,
+        "delays": delays,
+        "saturated": saturated,
+        "max_channels": max_channels,
+        "peak_minute": peak_minute,
+        "peak_rpm": peak_rpm,
+    }
+
+def _format_schedule_report(report: Dict[str, Any]) -> List[str]:
+    slots = report["slots"]
+    longest = max(slots, key=lambda x: x["duration"], default=None)
+    lines = [f"Planning : {len(slots)} créneau(x), {report['n_channels']} canal(aux)"]
+    if longest:
+        lines.append(f"Fan-out le plus long : {longest['name']} ≈ {int(longest['duration'])}s"
+                     f"{'' if longest['measured'] else ' (latence estimée)'}")
+    lines.append(f"Pic : {report['peak_rpm']:.0f} envois/min ({_fmt_week_s(report['peak_minute'] * 60)})")
+    if report["max_channels"] is not None:
+        lines.append(f"Capacité sans retard : {report['max_channels']} canal(aux)")
+    for err in report["errors"]:
+        lines.append(f"⚠️ {err}")
+    if report["saturated"]:
+        lines.append("⚠️ Fan-outs cumulés > 1 semaine : la file ne se vide jamais, retards croissants")
+    starts = {x["name"]: x["start"] for x in slots}
+    for name, behind, delay, end in report["delays"]:
+        lines.append(f"⚠️ {name} ({_fmt_week_s(starts[name])}) retardé de {int(delay)}s derrière {behind}"
+                     f" (fin prévue {_fmt_week_s(end)})")
+    return lines
 
 # ---------------- Workers ----------------
 async def _autopost_worker(post_cfg: Dict[str, Any]):
-    """Planifie et envoie ce post chaque semaine au jour/heure donnés, dans tous les CHANNEL_IDS."""
-    tz = ZoneInfo(config.TIMEZONE)
+    """Planifie et envoie ce post chaque semaine au jour/heure donnés, dans tous les canaux actifs."""
+    task_name = f"autopost:{post_cfg['name']}"
     wd, h, m = _resolve_schedule_tuple(post_cfg["schedule_var"])
 
     while True:
         wait_s = _seconds_until_next_weekly(wd, h, m, config.TIMEZONE)
-        logger.info(f"[autopost] {post_cfg['name']} prochain envoi dans {int(wait_s)}s ({post_cfg['schedule_var']}).")
+        logger.info("[autopost] %s prochain envoi dans %ds (%s).", post_cfg["name"], wait_s, post_cfg["schedule_var"],
+                    extra={"post": post_cfg["name"]})
+        _heartbeat(task_name, wait_s)
+        slot_ts = time.time() + wait_s  # échéance EDF : un créneau plus ancien passe avant
         await asyncio.sleep(max(1, wait_s))
+        # Borne large pour le fan-out : 30 s par canal (upload vidéo compris)
+        _heartbeat(task_name, len(_CHANNELS) * 30)
 
-        if not getattr(config, "CHANNEL_IDS", None):
-            logger.info(f"[autopost] Aucun CHANNEL_IDS dans config.py — envoi ignoré.")
+        if not _CHANNELS:
+            logger.info("[autopost] Aucun canal enregistré — envoi ignoré.", extra={"post": post_cfg["name"]})
         else:
-            sent = 0
-            for raw_ref in config.CHANNEL_IDS:  # int -100... ou "@username"
-                mid = await _send_autopost_to_chat(raw_ref, post_cfg)
-                if mid:
-                    delete_at = int((datetime.now(tz) + timedelta(days=config.AUTO_DELETE_AFTER_DAYS)).timestamp())
-                    # Résolution de l'ID définitif pour la DB
-                    chat_id = await _resolve_chat_id(raw_ref)
-                    if chat_id is not None:
-                        db_schedule_deletion(chat_id, mid, delete_at)
-                    sent += 1
-                await asyncio.sleep(0.25)
-            logger.info(f"[autopost] {post_cfg['name']} envoyé dans {sent} canal(aux).")
+            t0 = time.perf_counter()
+            sent, skipped = await _broadcast_post(post_cfg, LANE_SEND, slot_ts)
+            duration_ms = int((time.perf_counter() - t0) * 1000)
+            logger.info("[autopost] %s envoyé dans %d canal(aux), %d ignoré(s) (santé) en %d ms.",
+                        post_cfg["name"], sent, skipped, duration_ms,
+                        extra={"post": post_cfg["name"], "sent": sent, "skipped": skipped, "duration_ms": duration_ms})
+        _heartbeat(task_name, ran=True)
 
         # recalcul pour itération suivante
         wd, h, m = _resolve_schedule_tuple(post_cfg["schedule_var"])
@@ -685,17 +1716,175 @@ async def _autodelete_worker():
         now_ts = int(datetime.now().timestamp())
         rows = db_fetch_due_deletions(now_ts, limit=200)
         if rows:
-            logger.info(f"[autodelete] À supprimer: {len(rows)} messages")
+            logger.info("[autodelete] À supprimer: %d messages", len(rows))
+        log: List[Tuple[int, int, int, int, bool, int, Optional[int]]] = []
         for row_id, chat_id, message_id in rows:
+            # La voie delete passe après les envois : budget = fan-outs restants + marge, rafraîchi à chaque appel
+            _heartbeat("autodelete", sum(_FANOUTS_IN_FLIGHT.values()) * 30 + 60)
+            ok = False
+            exec_s = 0.0
             try:
-                await app_1.delete_messages(chat_id, message_id)
+                _, exec_s = await _rpc_timed(LANE_DELETE, lambda: app_1.delete_messages(chat_id, message_id))
+                ok = True
             except Exception as e:
-                logger.warning(f"[autodelete] {chat_id}:{message_id} -> {e}")
+                exec_s = getattr(e, "rpc_exec_s", 0.0)
+                logger.warning("[autodelete] %s:%s -> %s", chat_id, message_id, e, extra={"chat_id": chat_id})
             finally:
                 db_delete_deletion_row(row_id)
-            await asyncio.sleep(0.2)
+            log.append((int(time.time()), LOG_KIND_DELETE, -1, chat_id, ok, int(exec_s * 1000), message_id))
+        try:
+            db_record_sends(log)
+        except Exception as e:
+            logger.warning("[sendlog] Écriture du journal KO: %s", e)
+        _heartbeat("autodelete", 600, ran=True)
         await asyncio.sleep(600)
 
+async def _session_flush_worker():
+    """Recopie périodiquement la session mémoire (peers, états) dans session/bot1.session."""
+    storage = app_1.storage
+    if not isinstance(storage, BufferedFileStorage):
+        return
+    every_s = getattr(config, "SESSION_FLUSH_EVERY_S", 60)
+    while True:
+        _heartbeat("session_flush", every_s)
+        await asyncio.sleep(every_s)
+        try:
+            storage.flush()
+        except Exception as e:
+            logger.warning("[session] Flush KO: %s", e)
+        _heartbeat("session_flush", every_s, ran=True)
+
+# ---------------- Diagnostic : lag de la boucle asyncio ----------------
+# Un battement de cœur dans la boucle + un thread watchdog : si le battement s'arrête
+# au-delà du seuil, le watchdog capture la pile du thread de la boucle (code bloquant).
+_LAG_STALLS: deque = deque(maxlen=50)  # (horodatage, lag_ms, pile)
+_LOOP_BEAT = 0.0
+_LOOP_THREAD_ID: Optional[int] = None
+_STALL_STACK: Dict[float, str] = {}  # battement -> pile capturée pendant le blocage
+_LAG_THREAD: Optional[threading.Thread] = None
+
+def _lag_watchdog(threshold_s: float, tick_s: float):
+    while True:
+        time.sleep(threshold_s / 2)
+        beat = _LOOP_BEAT
+        # _LOOP_BEAT précède le sleep(tick_s) : même seuil que le moniteur, décalé d'un tick
+        if not beat or beat in _STALL_STACK or time.monotonic() - beat < threshold_s + tick_s:
+            continue
+        frame = sys._current_frames().get(_LOOP_THREAD_ID)
+        if frame is not None:
+            _STALL_STACK.clear()
+            _STALL_STACK[beat] = "".join(traceback.format_stack(frame)[-8:])
+
+async def _loop_lag_monitor():
+    """Mesure le retard de réveil de la boucle et consigne les blocages au-delà du seuil."""
+    global _LOOP_BEAT, _LOOP_THREAD_ID, _LAG_THREAD
+    tick_s = getattr(config, "LAG_TICK_S", 0.25)
+    threshold_s = getattr(config, "LAG_THRESHOLD_MS", 500) / 1000
+    _LOOP_THREAD_ID = threading.get_ident()
+    if _LAG_THREAD is None or not _LAG_THREAD.is_alive():
+        _LAG_THREAD = threading.Thread(target=_lag_watchdog, args=(threshold_s, tick_s), name="lag-watchdog", daemon=True)
+        _LAG_THREAD.start()
+    while True:
+        beat = time.monotonic()
+        _LOOP_BEAT = beat
+        _heartbeat("lag_monitor", tick_s)
+        await asyncio.sleep(tick_s)
+        lag_s = time.monotonic() - beat - tick_s
+        if lag_s < threshold_s:
+            continue
+        stack = _STALL_STACK.pop(beat, "(pile non capturée)")
+        _LAG_STALLS.append((int(time.time()), int(lag_s * 1000), stack))
+        logger.warning("[lag] Boucle bloquée %d ms\n%s", lag_s * 1000, stack,
+                       extra={"duration_ms": int(lag_s * 1000)})
+
+# ---------------- Maintenance (fenêtres calmes entre les créneaux) ----------------
+_MAINT_STATS: Dict[str, Dict[str, int]] = {}
+
+def _slot_distance_s() -> Tuple[float, float]:
+    """(secondes depuis le dernier créneau, secondes jusqu'au prochain), tous posts confondus."""
+    until = []
+    for p in MESSAGES:
+        try:
+            wd, h, m = _resolve_schedule_tuple(p["schedule_var"])
+        except ValueError:
+            continue
+        until.append(_seconds_until_next_weekly(wd, h, m, config.TIMEZONE))
+    if not until:
+        return float("inf"), float("inf")
+    week = 7 * 86400
+    return min(week - u for u in until), min(until)
+
+def _maintenance_prune() -> Dict[str, int]:
+    """Purge par lots des lignes terminales (journal expiré, agrégats anciens, canaux retirés)."""
+    today = int(time.time()) // 86400
+    log_before = today - getattr(config, "SEND_LOG_RETENTION_DAYS", 30)
+    agg_before = today - getattr(config, "SEND_AGG_RETENTION_DAYS", 180)
+    gone_before = int(time.time()) - getattr(config, "CHANNEL_GONE_RETENTION_DAYS", 30) * 86400
+    jobs = [
+        ("send_log", "day < ?", (log_before,), "rowid"),
+        ("send_agg", "day < ?", (agg_before,), "day, scope, key"),
+        ("channel_health", "chat_id IN (SELECT chat_id FROM channels WHERE active=0 AND updated_at < ?)",
+         (gone_before,), "rowid"),
+        ("channels", "active=0 AND updated_at < ?", (gone_before,), "rowid"),
+    ]
+    pruned = {}
+    for table, where, params, key in jobs:
+        total = 0
+        while True:
+            n = db_prune_batch(table, where, params, key=key)
+            total += n
+            if n < 1000:
+                break
+            time.sleep(0.05)  # laisse respirer les écrivains concurrents
+        pruned[table] = total
+    return pruned
+
+def _maintenance_run_all() -> Dict[str, Any]:
+    """Passe complète (exécutée dans un thread) : purge puis vacuum/checkpoint/ANALYZE."""
+    report: Dict[str, Any] = {"pruned": _maintenance_prune()}
+    for path in (DB_PATH, USERS_DB_PATH):
+        if path.exists():
+            report[path.name] = db_maintenance_run(path)
+    return report
+
+async def _maintenance_worker():
+    """Lance la maintenance SQLite quand aucun créneau n'est proche."""
+    for path in (DB_PATH, USERS_DB_PATH):
+        if path.exists():
+            try:
+                await asyncio.to_thread(db_maintenance_setup, path)
+            except Exception as e:
+                logger.warning("[maint] Configuration %s KO: %s", path.name, e)
+    last_run = 0.0
+    every_s = getattr(config, "MAINT_EVERY_S", 6 * 3600)
+    margin_s = getattr(config, "MAINT_QUIET_MARGIN_S", 15 * 60)
+    while True:
+        _heartbeat("maintenance", 300)
+        await asyncio.sleep(300)
+        since_last, until_next = _slot_distance_s()
+        if time.time() - last_run < every_s or until_next < margin_s or since_last < margin_s:
+            continue
+        if _FANOUTS_IN_FLIGHT:
+            # Fan-out en retard au-delà de la marge : la purge attendrait le verrou d'écriture
+            continue
+        try:
+            _heartbeat("maintenance", 3600)
+            report = await asyncio.to_thread(_maintenance_run_all)
+            last_run = time.time()
+            _heartbeat("maintenance", 300, ran=True)
+            for name, stats in report.items():
+                if name != "pruned":
+                    _MAINT_STATS[name] = stats
+            logger.info("[maint] Purge: %s", report["pruned"])
+            for name, st in _MAINT_STATS.items():
+                logger.info(
+                    "[maint] %s: %d Ko (+WAL %d Ko), %d pages de %d o, %d libres",
+                    name, st["file_bytes"] // 1024, st["wal_bytes"] // 1024,
+                    st["page_count"], st["page_size"], st["freelist_count"]
+                )
+        except Exception as e:
+            logger.warning("[maint] Maintenance KO: %s", e)
+
 # ---------------- Commandes admin (test & debug) ----------------
 @app_1.on_message(filters.command("force_post_index") & filters.user(config.ADMIN_ID))
 async def force_post_index_handler(client: Client, message: Message):
@@ -707,24 +1896,17 @@ async def force_post_index_handler(client: Client, message: Message):
         post = MESSAGES[idx]
     except Exception:
         return await message.reply_text("Index invalide.")
-    if not getattr(config, "CHANNEL_IDS", None):
-        return await message.reply_text("Aucun CHANNEL_IDS dans config.py.")
-    tz = ZoneInfo(config.TIMEZONE)
-    sent = 0
-    for raw_ref in config.CHANNEL_IDS:
-        mid = await _send_autopost_to_chat(raw_ref, post)
-        if mid:
-            delete_at = int((datetime.now(tz) + timedelta(days=config.AUTO_DELETE_AFTER_DAYS)).timestamp())
-            chat_id = await _resolve_chat_id(raw_ref)
-            if chat_id is not None:
-                db_schedule_deletion(chat_id, mid, delete_at)
-            sent += 1
-        await asyncio.sleep(0.25)
-    await message.reply_text(f"OK: post {idx} envoyé dans {sent} canal(aux).")
+    if not _CHANNELS:
+        return await message.reply_text("Aucun canal enregistré.")
+    sent, skipped = await _broadcast_post(post, LANE_ADMIN, time.time())
+    await message.reply_text(f"OK: post {idx} envoyé dans {sent} canal(aux), {skipped} ignoré(s) (santé).")
 
 @app_1.on_message(filters.command("start") & filters.user(config.ADMIN_ID))
 async def start_handler(client: Client, message: Message):
-    await message.reply_text("Bot OK. Utilise /force_post_index <i> pour tester un envoi.")
+    await message.reply_text(
+        "Bot OK. Utilise /force_post_index <i> pour tester un envoi.\n"
+        "Diagnostic : /status /health /channels /stats /lanes /dbstats /schedule_check /lag /profile <s>"
+    )
 
 @app_1.on_message(filters.command("resolve") & filters.user(config.ADMIN_ID))
 async def resolve_handler(client: Client, message: Message):
@@ -734,54 +1916,276 @@ async def resolve_handler(client: Client, message: Message):
         return await message.reply_text("Usage: /resolve <@username ou -100id>")
     raw = parts[1]
     try:
-        chat = await app_1.get_chat(raw)
+        chat = await _rpc(LANE_ADMIN, lambda: app_1.get_chat(raw))
         await message.reply_text(f"OK ✅\nTitle: {chat.title}\nType: {chat.type}\nID: {chat.id}")
     except Exception as e:
         await message.reply_text(f"KO ❌: {e}")
 
+@app_1.on_message(filters.command("health") & filters.user(config.ADMIN_ID))
+async def health_handler(client: Client, message: Message):
+    if not _CHANNEL_HEALTH:
+        return await message.reply_text("Registre de santé vide.")
+    now = int(time.time())
+    lines = []
+    for chat_id, h in sorted(_CHANNEL_HEALTH.items()):
+        line = f"{chat_id}: {h['status']}"
+        if h["status"] != HEALTH_OK:
+            line += f" (échecs={h['fail_count']}, re-test dans {max(0, h['next_probe_at'] - now)}s)"
+        lines.append(line)
+    await message.reply_text("\n".join(lines))
+
+@app_1.on_message(filters.command("channels") & filters.user(config.ADMIN_ID))
+async def channels_handler(client: Client, message: Message):
+    ids = _channels_snapshot()
+    if not ids:
+        return await message.reply_text("Aucun canal enregistré.")
+    lines = [f"{len(ids)} canal(aux) actif(s) :"]
+    for chat_id in ids[:50]:
+        h = _CHANNEL_HEALTH.get(chat_id)
+        lines.append(f"{chat_id} {_CHANNELS[chat_id]['title'] or ''} [{h['status'] if h else '?'}]")
+    if len(ids) > 50:
+        lines.append(f"… et {len(ids) - 50} autre(s)")
+    await message.reply_text("\n".join(lines))
+
+@app_1.on_message(filters.command("stats") & filters.user(config.ADMIN_ID))
+async def stats_handler(client: Client, message: Message):
+    # /stats [jours] — lu dans les agrégats, sans scanner le journal
+    parts = message.text.strip().split()
+    try:
+        days = int(parts[1]) if len(parts) > 1 else 7
+    except ValueError:
+        return await message.reply_text("Usage: /stats [jours]")
+    since_day = int(time.time()) // 86400 - days + 1
+
+    def _summ(row):
+        key, n, failed, lat_sum, lat_max, *hist = row
+        return key, n, failed, lat_sum // max(1, n), _hist_percentile(hist, lat_max, 0.95)
+
+    posts = sorted((_summ(r) for r in db_query_send_agg(AGG_SCOPE_POST, since_day)), key=lambda x: -x[4])
+    chans = sorted((_summ(r) for r in db_query_send_agg(AGG_SCOPE_CHANNEL, since_day)),
+                   key=lambda x: -(x[2] / max(1, x[1])))
+    if not posts:
+        return await message.reply_text(f"Aucun envoi sur {days} jour(s).")
+    lines = [f"Posts les plus lents ({days} j) :"]
+    for key, n, failed, avg, p95 in posts[:10]:
+        name = MESSAGES[key]["name"] if 0 <= key < len(MESSAGES) else str(key)
+        lines.append(f"{name}: p95={p95}ms moy={avg}ms envois={n} échecs={failed}")
+    lines.append("")
+    lines.append("Canaux avec le plus d'échecs :")
+    for key, n, failed, avg, p95 in chans[:10]:
+        lines.append(f"{key}: {failed}/{n} ({100 * failed // max(1, n)}%) p95={p95}ms")
+    await message.reply_text("\n".join(lines))
+
+@app_1.on_message(filters.command("dbstats") & filters.user(config.ADMIN_ID))
+async def dbstats_handler(client: Client, message: Message):
+    lines = []
+    for path in (DB_PATH, USERS_DB_PATH):
+        if not path.exists():
+            continue
+        st = db_storage_stats(path)
+        lines.append(
+            f"{path.name}: {st['file_bytes'] // 1024} Ko (+WAL {st['wal_bytes'] // 1024} Ko), "
+            f"{st['page_count']} pages de {st['page_size']} o, {st['freelist_count']} libres"
+        )
+    if isinstance(app_1.storage, BufferedFileStorage):
+        lines.append(f"Session ({_SESSION_STORAGE}): {app_1.storage.flushes} flush(s) disque")
+    else:
+        lines.append(f"Session ({_SESSION_STORAGE})")
+    since_last, until_next = _slot_distance_s()
+    lines.append(f"Prochain créneau dans {int(until_next)}s (dernier il y a {int(since_last)}s)")
+    if _FANOUTS_IN_FLIGHT:
+        lines.append(f"Fan-out(s) en cours : {len(_FANOUTS_IN_FLIGHT)} — maintenance différée")
+    await message.reply_text("\n".join(lines) or "Aucune base trouvée.")
+
+@app_1.on_message(filters.command("status") & filters.user(config.ADMIN_ID))
+async def status_handler(client: Client, message: Message):
+    view = _liveness()
+    now = time.time()
+    lines = [
+        f"Liveness: {'OK ✅' if view['alive'] else 'KO ❌'} — Readiness: {'OK ✅' if view['ready'] else 'KO ❌'}",
+        f"Connecté: {view['connected']} — Canaux actifs: {len(_CHANNELS)}",
+    ]
+    for name, t in sorted(_TASKS.items()):
+        if t["state"] == "running" and not _task_is_stale(t, now) and not t["restarts"]:
+            continue  # on n'affiche que ce qui mérite l'attention
+        last_run = f"{int(now - t['last_run'])}s" if t["last_run"] else "jamais"
+        lines.append(f"{name}: {t['state']}{' (muet)' if _task_is_stale(t, now) else ''} "
+                     f"redémarrages={t['restarts']} dernier run={last_run}"
+                     + (f"\n  ↳ {t['last_error']}" if t["last_error"] else ""))
+    healthy = sum(1 for t in _TASKS.values() if t["state"] == "running" and not _task_is_stale(t, now))
+    lines.append(f"{healthy}/{len(_TASKS)} tâche(s) saine(s)")
+    await message.reply_text("\n".join(lines)[:4000])
+
+@app_1.on_message(filters.command("lanes") & filters.user(config.ADMIN_ID))
+async def lanes_handler(client: Client, message: Message):
+    lines = ["Voie: traités / en file / attente p50 · p95 · max"]
+    for name, done, queued, p50, p95, mx in _lane_stats():
+        lines.append(f"{name}: {done} / {queued} / {p50:.2f}s · {p95:.2f}s · {mx:.2f}s")
+    await message.reply_text("\n".join(lines))
+
+@app_1.on_message(filters.command("schedule_check") & filters.user(config.ADMIN_ID))
+async def schedule_check_handler(client: Client, message: Message):
+    # /schedule_check [nb_canaux] — simule éventuellement un nombre de canaux donné
+    parts = message.text.strip().split()
+    try:
+        n_channels = int(parts[1]) if len(parts) > 1 else None
+    except ValueError:
+        return await message.reply_text("Usage: /schedule_check [nb_canaux]")
+    report = _analyse_schedule(n_channels)
+    await message.reply_text("\n".join(_format_schedule_report(report))[:4000])
+
+@app_1.on_message(filters.command("lag") & filters.user(config.ADMIN_ID))
+async def lag_handler(client: Client, message: Message):
+    if not _LAG_STALLS:
+        return await message.reply_text("Aucun blocage de la boucle enregistré.")
+    ts, lag_ms, stack = max(_LAG_STALLS, key=lambda x: x[1])
+    lines = [f"{len(_LAG_STALLS)} blocage(s) récent(s) :"]
+    for t, ms, _ in list(_LAG_STALLS)[-10:]:
+        lines.append(f"{datetime.fromtimestamp(t, ZoneInfo(config.TIMEZONE)):%d/%m %H:%M:%S} — {ms} ms")
+    lines.append(f"\nPire ({lag_ms} ms) :\n{stack}")
+    await message.reply_text("\n".join(lines)[:4000])
+
+_PROFILING = False
+
+def _is_idle_frame(func: str) -> bool:
+    return "'select." in func or "select.select" in func
+
+@app_1.on_message(filters.command("profile") & filters.user(config.ADMIN_ID))
+async def profile_handler(client: Client, message: Message):
+    # /profile [secondes] — profile le processus en cours (thread de la boucle) puis renvoie le top
+    global _PROFILING
+    parts = message.text.strip().split()
+    try:
+        seconds = min(300, max(1, int(parts[1]))) if len(parts) > 1 else 30
+    except ValueError:
+        return await message.reply_text("Usage: /profile [secondes]")
+    if _PROFILING:
+        return await message.reply_text("Un profilage est déjà en cours.")
+    _PROFILING = True
+    prof = cProfile.Profile()
+    try:
+        await message.reply_text(f"Profilage pendant {seconds}s…")
+        prof.enable()
+        await asyncio.sleep(seconds)
+    finally:
+        prof.disable()
+        _PROFILING = False
+    out = io.StringIO()
+    stats = pstats.Stats(prof, stream=out)
+    # Attente du selector (epoll/kqueue/select) = boucle au repos, pas du travail : exclue du top
+    rows = [kv for kv in stats.stats.items() if not _is_idle_frame(kv[0][2])]
+    rows = sorted(rows, key=lambda kv: kv[1][2], reverse=True)[:15]  # tottime
+    lines = [f"Top fonctions ({seconds}s, temps propre / cumulé / appels) :"]
+    for (filename, lineno, func), (cc, nc, tt, ct, _) in rows:
+        lines.append(f"{tt:.3f}s / {ct:.3f}s / {nc} — {func} ({Path(filename).name}:{lineno})")
+    await message.reply_text("\n".join(lines)[:4000])
+
+# ---------------- Events chat_member (promotion / rétrogradation / retrait) ----------------
+@app_1.on_chat_member_updated()
+async def chat_member_updated_handler(client: Client, update: ChatMemberUpdated):
+    new = update.new_chat_member
+    user = getattr(new, "user", None) or getattr(update.old_chat_member, "user", None)
+    if not user or user.id != _ME_ID:
+        return
+    chat = update.chat
+    if new is None:
+        _health_set(chat.id, HEALTH_GONE, error="chat_member: retiré")
+        return
+    status, can_post, can_delete = _health_from_member(chat.type, new)
+    _health_set(chat.id, status, can_post=can_post, can_delete=can_delete)
+    if status != HEALTH_GONE and new.status in (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER):
+        # Promu admin : le canal entre dans le fan-out (sans redémarrage)
+        _channel_add(chat.id, chat.title, chat.type)
+
 # ---------------- Préflight (sanity check droits & accès) ----------------
 async def _preflight_check():
+    global _ME_ID, _READY
     try:
         me = await app_1.get_me()
-        for raw in getattr(config, "CHANNEL_IDS", []):
-            try:
-                chat = await app_1.get_chat(raw)
-                # Tentative de lecture des privilèges si le bot est admin
-                try:
-                    member = await app_1.get_chat_member(chat.id, me.id)
-                    can_post = getattr(getattr(member, "privileges", None), "can_post_messages", None)
-                    can_delete = getattr(getattr(member, "privileges", None), "can_delete_messages", None)
-                    logger.info(f"[preflight] {chat.title} ({chat.id}) -> can_post={can_post} can_delete={can_delete}")
-                except Exception as e:
-                    logger.warning(f"[preflight] Impossible de lire les droits sur {chat.id}: {e}")
-            except Exception as e:
-                logger.warning(f"[preflight] Accès impossible à {raw}: {e}")
+        _ME_ID = me.id
+        # Graine config.CHANNEL_IDS + canaux du registre encore jamais testés
+        refs: List[int | str] = list(getattr(config, "CHANNEL_IDS", []))
+        refs += [cid for cid in _channels_snapshot() if cid not in _CHANNEL_HEALTH and cid not in refs]
+        for raw in refs:
+            probed = await _probe_channel(raw)
+            if probed is None:
+                continue
+            chat, status = probed
+            if status != HEALTH_GONE:  # GONE : déjà retiré par _health_set
+                _channel_add(chat.id, chat.title, chat.type)
     except Exception as e:
-        logger.warning(f"[preflight] Erreur globale: {e}")
+        logger.warning("[preflight] Erreur globale: %s", e)
+    _READY = True
+
+async def _health_reprobe_worker():
+    """Re-teste périodiquement les canaux en mauvaise santé dont le backoff est écoulé."""
+    every_s = getattr(config, "HEALTH_REPROBE_EVERY_S", 300)
+    while True:
+        _heartbeat("health_reprobe", every_s)
+        await asyncio.sleep(every_s)
+        now = time.time()
+        due = [cid for cid, h in _CHANNEL_HEALTH.items()
+               if cid in _CHANNELS and h["status"] != HEALTH_OK and h["next_probe_at"] <= now]
+        _heartbeat("health_reprobe", len(due) * 30)
+        for chat_id in due:
+            await _probe_channel(chat_id)
+        _heartbeat("health_reprobe", every_s, ran=True)
 
 # ---------------- Main (Pyrogram v2) ----------------
 async def main():
     await app_1.start()
+    if isinstance(app_1.storage, BufferedFileStorage):
+        # Clé d'auth et user_id tout juste négociés : sur disque sans attendre le flush périodique
+        app_1.storage.flush()
+
+    # Dispatcher RPC en premier : préflight et envois passent par lui
+    _supervise("rpc_dispatcher", _rpc_dispatcher)
 
-    # Préflight immédiat
+    # Registre de santé persistant, puis préflight immédiat (qui le rafraîchit)
+    _health_load()
+    _channels_load()
+    _media_load()
     await _preflight_check()
 
-    # Lancer un worker par post
+    # Lancer un worker par post (tous supervisés : redémarrage auto si exception)
     for post_cfg in MESSAGES:
-        asyncio.create_task(_autopost_worker(post_cfg))
+        _supervise(f"autopost:{post_cfg['name']}", lambda p=post_cfg: _autopost_worker(p))
 
     # Lancer le worker de suppression
-    asyncio.create_task(_autodelete_worker())
+    _supervise("autodelete", _autodelete_worker)
+
+    # Re-test périodique des canaux en mauvaise santé
+    _supervise("health_reprobe", _health_reprobe_worker)
+
+    # Maintenance SQLite dans les fenêtres calmes
+    _supervise("maintenance", _maintenance_worker)
+
+    # Persistance périodique de la session Pyrogram (mode "buffered")
+    _supervise("session_flush", _session_flush_worker)
+
+    # Surveillance du lag de la boucle
+    _supervise("lag_monitor", _loop_lag_monitor)
+
+    # Surveillance des tâches elles-mêmes
+    _supervise("watchdog", _supervisor_watchdog)
 
     # Log de sanity check statique
     try:
         for p in MESSAGES:
             day, hm = getattr(config, p["schedule_var"])
-            logger.info(f"[startup] {p['name']} -> {day} {hm}")
-        logger.info(f"[startup] CHANNEL_IDS = {getattr(config, 'CHANNEL_IDS', [])}")
+            logger.info("[startup] %s -> %s %s", p["name"], day, hm)
+        logger.info("[startup] %d canal(aux) actif(s) dans le registre", len(_CHANNELS))
     except Exception:
         pass
 
+    # Analyse de charge du planning avant que la semaine ne tourne
+    try:
+        report = _analyse_schedule()
+        log = logger.warning if report["delays"] or report["errors"] or report["saturated"] else logger.info
+        log("[schedule] %s", "\n".join(_format_schedule_report(report)))
+    except Exception as e:
+        logger.warning("[schedule] Analyse KO: %s", e)
+
     await idle()
     await app_1.stop()
 
@@ -790,3 +2194,5 @@ if __name__ == "__main__":
         asyncio.run(main())
     except KeyboardInterrupt:
         pass
+    finally:
+        _LOG_LISTENER.stop()
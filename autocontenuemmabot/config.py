@@ -6,8 +6,36 @@ API_HASH = "f49c3172164036fbf04432e096d444e8"
 ADMIN_ID = 6529167025
 BOT_TOKEN_1 = "8012198352:AAEadUjEX2rDOJaLyRz4jPYL5g75oh1Kz0I"
 
+# ----- Session Pyrogram -----
+# "buffered" : session en mémoire, recopiée dans session/bot1.session toutes les
+#              SESSION_FLUSH_EVERY_S et à l'arrêt (aucune écriture disque par envoi)
+# "wal"      : fichier SQLite en WAL + synchronous=NORMAL
+# "file"     : comportement Pyrogram d'origine
+SESSION_STORAGE = "buffered"
+SESSION_FLUSH_EVERY_S = 60
+
+# ----- Logs -----
+LOG_FORMAT = "text"     # "json" : une ligne JSON par log (post, chat_id, duration_ms…)
+LOG_WARN_BURST = 20     # WARNING max par catégorie ([autopost], [autodelete]…) …
+LOG_WARN_WINDOW_S = 60  # … et par fenêtre de N secondes ; le surplus est compté puis masqué
+
+# ----- Diagnostic -----
+LAG_TICK_S = 0.25        # période du battement de cœur de la boucle asyncio
+LAG_THRESHOLD_MS = 500   # blocage consigné (avec la pile) au-delà de ce retard
+
+# ----- Dispatcher RPC -----
+RPC_MIN_INTERVAL_S = 0.25  # écart mini entre deux appels Telegram, toutes voies confondues
+RPC_FLOODWAIT_RETRIES = 2  # remises en file d'un appel après FloodWait avant abandon
+
+# ----- Supervision des workers -----
+SUPERVISOR_BACKOFF_BASE_S = 5   # délai avant le 1er redémarrage d'un worker planté
+SUPERVISOR_BACKOFF_MAX_S = 600  # plafond (doublé à chaque plantage)
+SUPERVISOR_GRACE_S = 120        # tolérance avant de déclarer un worker muet
+
 # ----- Canaux ciblés -----
-# Mets ici les IDs de tes canaux (en int). Sur Telegram, les channels commencent souvent par -100...
+# Graine du registre dynamique (table `channels` de autopost.sqlite3) : ces canaux y sont
+# ajoutés au démarrage. Ensuite le bot ajoute/retire seul les canaux quand il est promu
+# admin ou retiré, sans redéploiement. IDs en int (-100...) ou "@username".
 CHANNEL_IDS = [
     -1003151893255,
     # -1009876543210,
@@ -16,6 +44,24 @@ CHANNEL_IDS = [
 # ----- Fuseau & suppression -----
 TIMEZONE = "Europe/Malta"   # ex: "Europe/Paris"
 AUTO_DELETE_AFTER_DAYS = 7  # suppression au bout d'1 semaine
+SEND_LOG_RETENTION_DAYS = 30  # rétention du journal détaillé des envois (agrégats conservés)
+SEND_AGG_RETENTION_DAYS = 180  # rétention des agrégats journaliers
+CHANNEL_GONE_RETENTION_DAYS = 30  # purge des canaux retirés depuis plus longtemps
+
+# ----- Maintenance SQLite -----
+MAINT_EVERY_S = 6 * 3600       # au plus une passe toutes les 6 h
+MAINT_QUIET_MARGIN_S = 15 * 60  # pas de maintenance à moins de 15 min d'un créneau
+
+# ----- Médias distants -----
+MEDIA_REVALIDATE_EVERY_S = 3600  # revalidation conditionnelle (ETag / Last-Modified) au plus 1x/h
+MEDIA_REVALIDATE_TIMEOUT_S = 10  # délai max d'une revalidation (copie locale disponible)
+MEDIA_DOWNLOAD_TIMEOUT_S = 120   # délai max du premier téléchargement
+MEDIA_RETRY_AFTER_S = 300        # revalidation en échec : on sert la copie locale et on réessaie après 5 min
+
+# ----- Santé des canaux -----
+HEALTH_REPROBE_EVERY_S = 300     # re-test des canaux en erreur / sans droits
+HEALTH_BACKOFF_BASE_S = 60       # 1er délai avant re-test, doublé à chaque échec
+HEALTH_BACKOFF_MAX_S = 6 * 3600  # plafond du backoff
 
 # ----- Planning par post (jour + HH:MM) -----
 POST1_SCHEDULE = ("lundi", "18:47")
@@ -0,0 +1,68 @@
+"""Tests de _analyse_schedule : file série EDF, report dimanche -> lundi, capacité, pic par minute."""
+import pytest
+
+pytest.importorskip("pyrogram")
+
+import os  # noqa: E402
+import tempfile  # noqa: E402
+
+import config  # noqa: E402
+
+# L'import de bot initialise la base : jamais celle du dépôt
+config.AUTOPOST_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="autopost_test_"), "autopost.sqlite3")
+
+import bot  # noqa: E402
+
+
+def _post(name: str, ptype: str = "text") -> dict:
+    return {"name": name, "schedule_var": f"{name.upper()}_SCHEDULE", "type": ptype,
+            "media": None, "text": "", "buttons": []}
+
+
+@pytest.fixture
+def schedule(monkeypatch):
+    """Remplace le planning par des créneaux synthétiques : schedule(("a", "dimanche", "23:58"), ...)."""
+    monkeypatch.setattr(bot, "RPC_MIN_INTERVAL_S", 0.25)
+    monkeypatch.setattr(bot, "db_query_send_agg", lambda scope, since_day: [])
+
+    def _set(*slots, latency_ms=None):
+        posts = []
+        for name, day, hhmm in slots:
+            monkeypatch.setattr(config, f"{name.upper()}_SCHEDULE", (day, hhmm), raising=False)
+            posts.append(_post(name))
+        monkeypatch.setattr(bot, "MESSAGES", posts)
+        if latency_ms is not None:
+            # send_agg par post : (key, n, failed, lat_sum, lat_max, h0..hN)
+            rows = [(idx, 10, 0, 10 * latency_ms, latency_ms) for idx in range(len(posts))]
+            monkeypatch.setattr(bot, "db_query_send_agg", lambda scope, since_day: rows)
+
+    return _set
+
+
+def test_sunday_fanout_delays_monday_slot(schedule):
+    # 400 canaux x 0,65 s = 260 s : le post de dimanche 23:58 finit lundi 00:02:20
+    schedule(("late", "dimanche", "23:58"), ("early", "lundi", "00:00"), latency_ms=400)
+    report = bot._analyse_schedule(n_channels=400)
+
+    assert len(report["delays"]) == 1
+    name, behind, delay, end = report["delays"][0]
+    assert (name, behind) == ("early", "late")
+    assert delay == pytest.approx(140)
+    assert end == pytest.approx(140 + 260)
+    assert not report["saturated"]
+
+
+def test_peak_rate_is_capped_by_serial_execution(schedule):
+    # Deux fan-outs qui se chevauchent restent servis l'un après l'autre : 60 / 0,65 s ≈ 92 envois/min
+    schedule(("a", "mardi", "10:00"), ("b", "mardi", "10:01"), latency_ms=400)
+    report = bot._analyse_schedule(n_channels=300)
+
+    assert int(report["peak_rpm"]) == 92
+    assert report["peak_minute"] == (1 * 1440 + 10 * 60)
+
+
+def test_max_channels_for_adjacent_slots(schedule):
+    schedule(("p1", "lundi", "18:55"), ("p2", "lundi", "18:56"))  # latence par défaut du texte : 400 ms
+    assert bot._analyse_schedule(n_channels=92)["max_channels"] == 92
+    assert not bot._analyse_schedule(n_channels=92)["delays"]
+    assert bot._analyse_schedule(n_channels=93)["delays"][0][:2] == ("p2", "p1")